@@ -5,21 +5,182 @@ Analyzes a specific Graph of Thoughts experiment run
 """
 
 import json
-import glob
 import os
+import pickle
+import re
 import sys
-from typing import Dict, List
-import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-def extract_results(experiment_name: str) -> List[Dict]:
+import numpy as np
+
+try:
+    import orjson
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> bytes:
+        # Integer keys (error_distribution) are written as strings, like the json module does
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, indent=2).encode()
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+_DIGIT_RE = re.compile(r'\d+')
+
+# Parsed results are cached next to each experiment's method directory and invalidated when any
+# result file changes. Bump the version whenever the extracted fields or their meaning change, so
+# that caches written by older versions of this script are not reused.
+_CACHE_VERSION = 1
+
+# Traces larger than this are stream-parsed (if ijson is installed) so that a
+# worker only ever holds one operation in memory instead of the whole file.
+_STREAM_THRESHOLD = 8 * 1024 * 1024
+
+def _read_fd(fd: int, size: int) -> bytes:
+    """
+    Read `size` bytes from a raw file descriptor, bypassing Python's buffered file objects.
+    
+    :param fd: Open file descriptor
+    :param size: Number of bytes to read
+    :return: File contents
+    """
+    buf = os.read(fd, size)
+    # A single read returns the whole file except for very large files
+    while len(buf) < size:
+        chunk = os.read(fd, size - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+def _scan_operations(file_path: str) -> Tuple[Optional[Dict[str, Any]], Any]:
+    """
+    Find the ground_truth_evaluator operation and the last entry of a result file.
+    
+    :param file_path: Path to the JSON result file
+    :return: Tuple of (ground_truth_evaluator operation, last entry)
+    """
+    ground_truth_op: Optional[Dict[str, Any]] = None
+    last: Any = None
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if ijson is not None and size > _STREAM_THRESHOLD:
+            with os.fdopen(fd, 'rb', closefd=False) as f:
+                for op in ijson.items(f, 'item', use_float=True):
+                    if ground_truth_op is None and isinstance(op, dict) and op.get("operation") == "ground_truth_evaluator":
+                        ground_truth_op = op
+                    last = op
+            return ground_truth_op, last
+        
+        data = _loads(_read_fd(fd, size))
+    finally:
+        os.close(fd)
+    
+    for op in data:
+        if isinstance(op, dict) and op.get("operation") == "ground_truth_evaluator":
+            ground_truth_op = op
+            break
+    if data:
+        last = data[-1]
+    return ground_truth_op, last
+
+def _parse_one(sample_id: int, file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a single result file. Runs inside a worker process.
+    
+    :param sample_id: Sample ID taken from the file name
+    :param file_path: Path to the JSON result file
+    :return: Result dictionary, or None if the file could not be used
+    """
+    try:
+        # Find the ground_truth_evaluator operation and token usage (last entry in JSON)
+        ground_truth_op, token_info = _scan_operations(file_path)
+        
+        if not ground_truth_op:
+            print(f"WARNING: No ground_truth_evaluator found in {file_path}", flush=True)
+            return None
+            
+        # Skip samples without token usage rather than counting them as zero tokens
+        if not isinstance(token_info, dict) or "prompt_tokens" not in token_info or "completion_tokens" not in token_info:
+            print(f"WARNING: No token usage found at the end of {file_path}", flush=True)
+            return None
+        prompt_tokens = token_info["prompt_tokens"]
+        completion_tokens = token_info["completion_tokens"]
+        
+        # Extract final thought state
+        final_thought = ground_truth_op["thoughts"][0]
+        
+        return {
+            'sample_id': sample_id,
+            'original': final_thought["original"],
+            'model_output': final_thought["current"],
+            'solved': final_thought.get("problem_solved", [False])[0],
+            'error_score': ground_truth_op["scores"][0],
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+        
+    except Exception as e:
+        print(f"ERROR processing {file_path}: {e}", flush=True)
+        return None
+
+def _new_totals(capacity: int) -> Dict:
+    """
+    Create empty running totals for up to `capacity` results.
+    
+    :param capacity: Maximum number of results that will be accumulated
+    :return: Running totals
+    """
+    return {
+        'count': 0,
+        'solved_count': 0,
+        'sum_error': 0,
+        'sum_prompt_tokens': 0,
+        'sum_completion_tokens': 0,
+        'min_error': None,
+        'max_error': None,
+        'error_scores': np.empty(capacity, dtype=np.int64)
+    }
+
+def _accumulate(totals: Dict, result: Dict) -> None:
+    """
+    Add a single result to the running totals.
+    
+    :param totals: Running totals from _new_totals
+    :param result: Result dictionary
+    """
+    error_score = result['error_score']
+    totals['error_scores'][totals['count']] = error_score
+    totals['count'] += 1
+    if result['solved']:
+        totals['solved_count'] += 1
+    totals['sum_error'] += error_score
+    totals['sum_prompt_tokens'] += result['prompt_tokens']
+    totals['sum_completion_tokens'] += result['completion_tokens']
+    if totals['min_error'] is None or error_score < totals['min_error']:
+        totals['min_error'] = error_score
+    if totals['max_error'] is None or error_score > totals['max_error']:
+        totals['max_error'] = error_score
+
+def extract_results(experiment_name: str) -> Tuple[List[Dict], Dict]:
     """
     Extract results from a specific experiment run.
     
+    Summary totals are accumulated while the results are collected, so that
+    analyze_results does not need another pass over the data.
+    
     :param experiment_name: Name of experiment (e.g., 'vllm_got_2025-09-07_15-55-48')
-    :return: List of result dictionaries
+    :return: List of result dictionaries ordered by sample ID, and their running totals
     """
-    results = []
-    
     # Build path to experiment results - auto-detect method subdirectory
     method_subdir = "got"  # default
     if "_tot_" in experiment_name:
@@ -31,91 +192,98 @@ def extract_results(experiment_name: str) -> List[Dict]:
     
     if not os.path.exists(experiment_path):
         print(f"ERROR: Experiment path not found: {experiment_path}")
-        return []
+        return [], _new_totals(0)
     
-    # Find all JSON result files in the got directory
-    json_files = glob.glob(os.path.join(experiment_path, "*.json"))
+    # Find all JSON result files in the got directory, ordered by sample ID.
+    # The newest modification time identifies this exact set of files for the cache.
+    entries = []
+    latest_mtime = os.stat(experiment_path).st_mtime_ns
+    with os.scandir(experiment_path) as it:
+        for entry in it:
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                entries.append((int(entry.name[:-5]), entry.path))
+            except ValueError:
+                print(f"WARNING: Skipping non-sample file {entry.path}")
+                continue
+            latest_mtime = max(latest_mtime, entry.stat().st_mtime_ns)
+    entries.sort()
     
-    if not json_files:
+    if not entries:
         print(f"ERROR: No JSON files found in: {experiment_path}")
-        return []
+        return [], _new_totals(0)
     
-    print(f"Found {len(json_files)} result files in {experiment_name}")
+    print(f"Found {len(entries)} result files in {experiment_name}")
     
-    for file_path in sorted(json_files):
+    cache_key = (_CACHE_VERSION, len(entries), latest_mtime)
+    cache_file = os.path.join("results", experiment_name, f".analysis_cache_{method_subdir}.pkl")
+    try:
+        with open(cache_file, 'rb') as f:
+            cached_key, results, totals = pickle.load(f)
+        if cached_key == cache_key:
+            print(f"Loaded cached results from {cache_file}")
+            return results, totals
+    except Exception:
+        pass
+    
+    results = []
+    totals = _new_totals(len(entries))
+    sample_ids, json_files = zip(*entries)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for result in executor.map(_parse_one, sample_ids, json_files, chunksize=8):
+            if result is not None:
+                results.append(result)
+                _accumulate(totals, result)
+    
+    # Write to a temporary file first so an interrupted run never leaves a truncated cache.
+    # Failing to write the cache must not lose the results that were just parsed.
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump((cache_key, results, totals), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"WARNING: Could not write results cache {cache_file}: {e}")
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            
-            # Extract sample ID from filename
-            sample_id = int(os.path.basename(file_path).replace('.json', ''))
-            
-            # Find the ground_truth_evaluator operation
-            ground_truth_op = None
-            for op in data:
-                if isinstance(op, dict) and op.get("operation") == "ground_truth_evaluator":
-                    ground_truth_op = op
-                    break
-            
-            if not ground_truth_op:
-                print(f"WARNING: No ground_truth_evaluator found in {file_path}")
-                continue
-                
-            # Extract final thought state
-            final_thought = ground_truth_op["thoughts"][0]
-            
-            # Find token usage (last entry in JSON)
-            token_info = data[-1]
-            
-            result = {
-                'sample_id': sample_id,
-                'file_path': file_path,
-                'original': final_thought["original"],
-                'model_output': final_thought["current"],
-                'solved': final_thought.get("problem_solved", [False])[0],
-                'error_score': ground_truth_op["scores"][0],
-                'prompt_tokens': token_info.get("prompt_tokens", 0),
-                'completion_tokens': token_info.get("completion_tokens", 0),
-                'total_tokens': token_info.get("prompt_tokens", 0) + token_info.get("completion_tokens", 0)
-            }
-            
-            results.append(result)
-            
-        except Exception as e:
-            print(f"ERROR processing {file_path}: {e}")
-            continue
+            os.remove(tmp_file)
+        except OSError:
+            pass
     
-    return results
+    return results, totals
 
-def analyze_results(results: List[Dict]) -> Dict:
+def analyze_results(results: List[Dict], totals: Optional[Dict] = None) -> Dict:
     """
     Analyze extracted results and calculate key metrics.
     
     :param results: List of result dictionaries
+    :param totals: Running totals from extract_results; computed from results if omitted
     :return: Analysis summary
     """
     if not results:
         return {}
     
-    total_samples = len(results)
-    solved_count = sum(1 for r in results if r['solved'])
-    error_scores = [r['error_score'] for r in results]
-    prompt_tokens = [r['prompt_tokens'] for r in results]
-    completion_tokens = [r['completion_tokens'] for r in results]
-    total_tokens = [r['total_tokens'] for r in results]
+    if totals is None:
+        totals = _new_totals(len(results))
+        for r in results:
+            _accumulate(totals, r)
     
+    total_samples = totals['count']
+    solved_count = totals['solved_count']
+    error_scores = totals['error_scores'][:total_samples]
+    total_tokens_used = totals['sum_prompt_tokens'] + totals['sum_completion_tokens']
     analysis = {
         'total_samples': total_samples,
         'solved_count': solved_count,
         'success_rate': solved_count / total_samples,
-        'avg_error_score': statistics.mean(error_scores),
-        'error_distribution': {i: error_scores.count(i) for i in range(max(error_scores) + 1)},
-        'avg_prompt_tokens': statistics.mean(prompt_tokens),
-        'avg_completion_tokens': statistics.mean(completion_tokens),
-        'avg_total_tokens': statistics.mean(total_tokens),
-        'total_tokens_used': sum(total_tokens),
-        'min_error': min(error_scores),
-        'max_error': max(error_scores)
+        'avg_error_score': totals['sum_error'] / total_samples,
+        'error_distribution': dict(enumerate(np.bincount(error_scores).tolist())),
+        'avg_prompt_tokens': totals['sum_prompt_tokens'] / total_samples,
+        'avg_completion_tokens': totals['sum_completion_tokens'] / total_samples,
+        'avg_total_tokens': total_tokens_used / total_samples,
+        'total_tokens_used': total_tokens_used,
+        'min_error': totals['min_error'],
+        'max_error': totals['max_error']
     }
     
     return analysis
@@ -125,7 +293,7 @@ def print_baseline_report(analysis: Dict, results: List[Dict], experiment_name:
     Print a comprehensive baseline report.
     
     :param analysis: Analysis summary
-    :param results: Raw results for detailed breakdown
+    :param results: Raw results for detailed breakdown, ordered by sample ID
     :param experiment_name: Name of the experiment being analyzed
     """
     # Auto-detect method for report title
@@ -135,9 +303,9 @@ def print_baseline_report(analysis: Dict, results: List[Dict], experiment_name:
     elif "_got_" in experiment_name:
         method_abbrev = "GoT"
     
-    print("\n" + "=" * 60)
-    print(f"vLLM + {method_abbrev} BASELINE EVALUATION REPORT")
-    print("=" * 60)
+    lines = ["\n" + "=" * 60]
+    lines.append(f"vLLM + {method_abbrev} BASELINE EVALUATION REPORT")
+    lines.append("=" * 60)
     # Auto-detect task size from experiment name or data
     task_size = "32"
     if "064" in experiment_name:
@@ -147,11 +315,13 @@ def print_baseline_report(analysis: Dict, results: List[Dict], experiment_name:
         original_data = results[0].get('original', '')
         if original_data:
             try:
-                # Count elements in the original list string
-                import re
-                numbers = re.findall(r'\d+', original_data)
-                if len(numbers) >= 60:
-                    task_size = "64"
+                # Count elements in the original list string, stopping once the threshold is reached
+                count = 0
+                for _ in _DIGIT_RE.finditer(original_data):
+                    count += 1
+                    if count >= 60:
+                        task_size = "64"
+                        break
             except:
                 pass
     
@@ -162,42 +332,45 @@ def print_baseline_report(analysis: Dict, results: List[Dict], experiment_name:
     elif "_got_" in experiment_name:
         method_name = "Graph of Thoughts (GoT)"
     
-    print(f"Experiment: {experiment_name}")
-    print(f"Model: Qwen2-7B-Instruct")
-    print(f"Method: {method_name}")
-    print(f"Task: {task_size}-element list sorting")
-    print()
+    lines.append(f"Experiment: {experiment_name}")
+    lines.append(f"Model: Qwen2-7B-Instruct")
+    lines.append(f"Method: {method_name}")
+    lines.append(f"Task: {task_size}-element list sorting")
+    lines.append("")
     
     # Core Performance Metrics
-    print("PERFORMANCE METRICS:")
-    print(f"   Success Rate: {analysis['success_rate']:.1%} ({analysis['solved_count']}/{analysis['total_samples']})")
-    print(f"   Average Error Score: {analysis['avg_error_score']:.2f}")
-    print(f"   Error Range: {analysis['min_error']} - {analysis['max_error']}")
-    print()
+    lines.append("PERFORMANCE METRICS:")
+    lines.append(f"   Success Rate: {analysis['success_rate']:.1%} ({analysis['solved_count']}/{analysis['total_samples']})")
+    lines.append(f"   Average Error Score: {analysis['avg_error_score']:.2f}")
+    lines.append(f"   Error Range: {analysis['min_error']} - {analysis['max_error']}")
+    lines.append("")
     
     # Error Distribution
-    print("ERROR DISTRIBUTION:")
+    lines.append("ERROR DISTRIBUTION:")
     for error_score, count in analysis['error_distribution'].items():
         percentage = count / analysis['total_samples'] * 100
-        print(f"   Score {error_score}: {count} samples ({percentage:.1f}%)")
-    print()
+        lines.append(f"   Score {error_score}: {count} samples ({percentage:.1f}%)")
+    lines.append("")
     
     # Token Usage
-    print("TOKEN USAGE:")
-    print(f"   Avg Prompt Tokens: {analysis['avg_prompt_tokens']:.0f}")
-    print(f"   Avg Completion Tokens: {analysis['avg_completion_tokens']:.0f}")
-    print(f"   Avg Total Tokens/Sample: {analysis['avg_total_tokens']:.0f}")
-    print(f"   Total Tokens Used: {analysis['total_tokens_used']:,}")
-    print()
+    lines.append("TOKEN USAGE:")
+    lines.append(f"   Avg Prompt Tokens: {analysis['avg_prompt_tokens']:.0f}")
+    lines.append(f"   Avg Completion Tokens: {analysis['avg_completion_tokens']:.0f}")
+    lines.append(f"   Avg Total Tokens/Sample: {analysis['avg_total_tokens']:.0f}")
+    lines.append(f"   Total Tokens Used: {analysis['total_tokens_used']:,}")
+    lines.append("")
     
     # Sample-by-Sample Breakdown
-    print("DETAILED BREAKDOWN:")
-    results_sorted = sorted(results, key=lambda x: x['sample_id'])
-    for r in results_sorted:
-        status = "SOLVED" if r['solved'] else "FAILED"
-        print(f"   Sample {r['sample_id']}: {status} (Error Score: {r['error_score']}, Tokens: {r['total_tokens']})")
+    lines.append("DETAILED BREAKDOWN:")
+    lines.extend(
+        f"   Sample {r['sample_id']}: {'SOLVED' if r['solved'] else 'FAILED'} (Error Score: {r['error_score']}, Tokens: {r['total_tokens']})"
+        for r in results
+    )
+    
+    lines.append("\n" + "=" * 60)
     
-    print("\n" + "=" * 60)
+    # Emit the whole report with a single write
+    sys.stdout.write("\n".join(lines) + "\n")
 
 def main():
     """Main execution function."""
@@ -210,26 +383,26 @@ def main():
     print(f"Analyzing experiment: {experiment_name}")
     
     # Extract results
-    results = extract_results(experiment_name)
+    results, totals = extract_results(experiment_name)
     
     if not results:
         print("ERROR: No results to analyze. Check the experiment name and path.")
         return
     
     # Analyze results  
-    analysis = analyze_results(results)
+    analysis = analyze_results(results, totals)
     
     # Print report
     print_baseline_report(analysis, results, experiment_name)
     
     # Save raw data for further analysis
     output_file = f"{experiment_name}_analysis.json"
-    with open(output_file, 'w') as f:
-        json.dump({
+    with open(output_file, 'wb') as f:
+        f.write(_dumps({
             'experiment_name': experiment_name,
             'analysis': analysis,
             'raw_results': results
-        }, f, indent=2)
+        }))
     
     print(f"\nDetailed results saved to: {output_file}")
 
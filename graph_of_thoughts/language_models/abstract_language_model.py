@@ -7,7 +7,8 @@
 # main author: Nils Blach
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Tuple, Union, Any
+import hashlib
 import json
 import os
 import logging
@@ -36,7 +37,7 @@ class AbstractLanguageModel(ABC):
         self.model_name: str = model_name
         self.cache = cache
         if self.cache:
-            self.response_cache: Dict[str, List[Any]] = {}
+            self.response_cache: Dict[Tuple[bytes, int], Any] = {}
         self.load_config(config_path)
         self.prompt_tokens: int = 0
         self.completion_tokens: int = 0
@@ -65,6 +66,23 @@ class AbstractLanguageModel(ABC):
         """
         self.response_cache.clear()
 
+    @staticmethod
+    def _cache_key(query: str, num_responses: int) -> Tuple[bytes, int]:
+        """
+        Build the response cache key for a query.
+
+        The query is reduced to a fixed-size digest, so long prompts are neither
+        stored in the cache nor rehashed in full on every lookup.
+
+        :param query: The query posed to the language model.
+        :type query: str
+        :param num_responses: The number of desired responses.
+        :type num_responses: int
+        :return: The cache key.
+        :rtype: Tuple[bytes, int]
+        """
+        return hashlib.blake2b(query.encode(), digest_size=16).digest(), num_responses
+
     @abstractmethod
     def query(self, query: str, num_responses: int = 1) -> Any:
         """
@@ -73,8 +73,11 @@ class ChatGPT(AbstractLanguageModel):
         :return: Response(s) from the OpenAI model.
         :rtype: Dict
         """
-        if self.cache and query in self.response_cache:
-            return self.response_cache[query]
+        if self.cache:
+            key = self._cache_key(query, num_responses)
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
 
         if num_responses == 1:
             response = self.chat([{"role": "user", "content": query}], num_responses)
@@ -98,7 +101,7 @@ class ChatGPT(AbstractLanguageModel):
                     total_num_attempts -= 1
 
         if self.cache:
-            self.response_cache[query] = response
+            self.response_cache[key] = response
         return response
 
     @backoff.on_exception(backoff.expo, OpenAIError, max_time=10, max_tries=6)
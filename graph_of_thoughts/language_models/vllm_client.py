@@ -4,16 +4,36 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import asyncio
 import backoff
+import httpx
+import json
 import os
 import random
 import time
-from typing import List, Dict, Union
-from openai import OpenAI, OpenAIError
-from openai.types.chat.chat_completion import ChatCompletion
+import typing
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple, Union
 
 from .abstract_language_model import AbstractLanguageModel
 
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+try:
+    # httpx only supports HTTP/2 when the h2 package is installed
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
 
 class vLLMClient(AbstractLanguageModel):
     """
@@ -60,79 +80,266 @@ class vLLMClient(AbstractLanguageModel):
         # API key for vLLM server (can be dummy for local servers)
         self.api_key: str = self.config.get("api_key", "dummy-key")
         
-        # Initialize the OpenAI Client pointing to vLLM server
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
+        # Maximum number of cached responses; the least recently used entry is evicted first.
+        self.cache_size: int = self.config.get("cache_size", 10000)
+        if self.cache:
+            self.response_cache: typing.OrderedDict[Tuple[bytes, int], List[str]] = OrderedDict()
+        
+        # Opt-in: split queries with num_responses > 1 into concurrent server calls of at most this many
+        # responses each. None sends a single request with n=num_responses, which lets vLLM share the
+        # prompt prefix. Splitting bills the prompt once per call, so the reported prompt tokens grow
+        # with the number of calls and are not comparable to runs without splitting.
+        self.request_chunk_size: Optional[int] = self.config.get("request_chunk_size", None)
+        
+        # Timeout in seconds for a single request to the vLLM server.
+        self.timeout: float = self.config.get("timeout", 600.0)
+        
+        # Maximum number of open connections to the vLLM server; half of them are kept alive between requests.
+        self.max_connections: int = self.config.get("max_connections", 128)
+        
+        # Whether to negotiate HTTP/2 (TLS endpoints only), so concurrent requests share one connection.
+        self.http2: bool = self.config.get("http2", True) and _HTTP2_AVAILABLE
+        
+        # Talk to the OpenAI-compatible endpoint directly and keep responses as plain dicts,
+        # which avoids the OpenAI SDK's pydantic model construction on every response.
+        client_options = {
+            "base_url": self.base_url,
+            "headers": {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            },
+            "timeout": httpx.Timeout(self.timeout),
+            "limits": httpx.Limits(
+                max_keepalive_connections=self.max_connections // 2,
+                max_connections=self.max_connections,
+            ),
+            "http2": self.http2,
+        }
+        self.client = httpx.Client(**client_options)
+        
+        # Async client for concurrent requests, driven by a dedicated event loop so that
+        # its connection pool stays valid across queries. The loop is created on first use.
+        self.aclient = httpx.AsyncClient(**client_options)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def close(self) -> None:
+        """
+        Close the HTTP clients and the private event loop.
+        """
+        self.client.close()
+        if self._loop is not None:
+            self._loop.run_until_complete(self.aclient.aclose())
+            self._loop.close()
+            self._loop = None
 
     def query(
         self, query: str, num_responses: int = 1
-    ) -> Union[List[ChatCompletion], ChatCompletion]:
+    ) -> Union[List[Dict], Dict, List[str]]:
         """
         Query the vLLM server for responses.
+        Cache hits return the response texts rather than the full response objects.
 
         :param query: The query to be posed to the language model.
         :type query: str
         :param num_responses: Number of desired responses, default is 1.
         :type num_responses: int
         :return: Response(s) from the vLLM server.
-        :rtype: Union[List[ChatCompletion], ChatCompletion]
+        :rtype: Union[List[Dict], Dict, List[str]]
         """
-        if self.cache and query in self.response_cache:
-            return self.response_cache[query]
+        if self.cache:
+            key = self._cache_key(query, num_responses)
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                self.response_cache.move_to_end(key)
+                return cached
 
         if num_responses == 1:
             response = self.chat([{"role": "user", "content": query}], num_responses)
+        elif self.request_chunk_size is None or self._in_running_loop():
+            # The private event loop cannot be driven from inside another running loop,
+            # so callers that already run one get the sequential path.
+            response = self._chat_sequentially(
+                [{"role": "user", "content": query}], num_responses
+            )
         else:
-            response = []
-            next_try = num_responses
-            total_num_attempts = num_responses
-            while num_responses > 0 and total_num_attempts > 0:
-                try:
-                    assert next_try > 0
-                    res = self.chat([{"role": "user", "content": query}], next_try)
-                    response.append(res)
-                    num_responses -= next_try
-                    next_try = min(num_responses, next_try)
-                except Exception as e:
-                    next_try = (next_try + 1) // 2
-                    self.logger.warning(
-                        f"Error in vLLM client: {e}, trying again with {next_try} samples"
-                    )
-                    time.sleep(random.randint(1, 3))
-                    total_num_attempts -= 1
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+            response = self._loop.run_until_complete(
+                self._chat_concurrently([{"role": "user", "content": query}], num_responses)
+            )
 
         if self.cache:
-            self.response_cache[query] = response
+            # Only keep the texts; the full response objects are large and never reused.
+            self.response_cache[key] = self.get_response_texts(response)
+            if len(self.response_cache) > self.cache_size:
+                self.response_cache.popitem(last=False)
         return response
 
-    @backoff.on_exception(backoff.expo, OpenAIError, max_time=10, max_tries=6)
-    def chat(self, messages: List[Dict], num_responses: int = 1) -> ChatCompletion:
+    @staticmethod
+    def _in_running_loop() -> bool:
+        """
+        Check whether the caller is running inside an asyncio event loop.
+
+        :return: True if an event loop is running in the current thread.
+        :rtype: bool
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    def _request_body(self, messages: List[Dict], num_responses: int) -> bytes:
+        """
+        Serialize a chat completion request.
+
+        :param messages: A list of message dictionaries for the chat.
+        :type messages: List[Dict]
+        :param num_responses: Number of desired responses.
+        :type num_responses: int
+        :return: The JSON encoded request body.
+        :rtype: bytes
+        """
+        return _dumps(
+            {
+                "model": self.model_id,
+                "messages": messages,
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "n": num_responses,
+                "stop": self.stop,
+            }
+        )
+
+    @backoff.on_exception(backoff.expo, httpx.HTTPError, max_time=10, max_tries=6)
+    def chat(self, messages: List[Dict], num_responses: int = 1) -> Dict:
         """
         Send chat messages to the vLLM server and retrieves the model's response.
-        Implements backoff on OpenAI error.
+        Implements backoff on HTTP error.
 
         :param messages: A list of message dictionaries for the chat.
         :type messages: List[Dict]
         :param num_responses: Number of desired responses, default is 1.
         :type num_responses: int
         :return: The vLLM server's response.
-        :rtype: ChatCompletion
-        """
-        response = self.client.chat.completions.create(
-            model=self.model_id,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            n=num_responses,
-            stop=self.stop,
+        :rtype: Dict
+        """
+        res = self.client.post(
+            "/chat/completions", content=self._request_body(messages, num_responses)
         )
+        res.raise_for_status()
+        response = _loads(res.content)
+        self._update_usage(response)
+        return response
 
+    def _chat_sequentially(
+        self, messages: List[Dict], num_responses: int
+    ) -> List[Dict]:
+        """
+        Request num_responses samples with as few calls as possible, starting with a single call.
+        If a call fails, the number of samples per call is halved and the remainder is retried.
+
+        :param messages: A list of message dictionaries for the chat.
+        :type messages: List[Dict]
+        :param num_responses: Number of desired responses.
+        :type num_responses: int
+        :return: The vLLM server's responses.
+        :rtype: List[Dict]
+        """
+        response = []
+        next_try = num_responses
+        total_num_attempts = num_responses
+        while num_responses > 0 and total_num_attempts > 0:
+            try:
+                assert next_try > 0
+                res = self.chat(messages, next_try)
+                response.append(res)
+                num_responses -= next_try
+                next_try = min(num_responses, next_try)
+            except Exception as e:
+                next_try = (next_try + 1) // 2
+                self.logger.warning(
+                    f"Error in vLLM client: {e}, trying again with {next_try} samples"
+                )
+                time.sleep(random.randint(1, 3))
+                total_num_attempts -= 1
+        return response
+
+    async def _chat_concurrently(
+        self, messages: List[Dict], num_responses: int
+    ) -> List[Dict]:
+        """
+        Request num_responses samples as concurrent calls of at most request_chunk_size samples each.
+        Calls that fail are split in half and retried.
+
+        :param messages: A list of message dictionaries for the chat.
+        :type messages: List[Dict]
+        :param num_responses: Number of desired responses.
+        :type num_responses: int
+        :return: The vLLM server's responses.
+        :rtype: List[Dict]
+        """
+        chunk_size = max(1, self.request_chunk_size)
+        pending = [
+            min(chunk_size, num_responses - i) for i in range(0, num_responses, chunk_size)
+        ]
+        response = []
+        total_num_attempts = num_responses
+        while pending and total_num_attempts > 0:
+            results = await asyncio.gather(
+                *[self._achat(messages, n) for n in pending], return_exceptions=True
+            )
+            failed = []
+            for n, res in zip(pending, results):
+                if isinstance(res, BaseException):
+                    failed.append((n, res))
+                else:
+                    response.append(res)
+            if not failed:
+                break
+            pending = []
+            for n, e in failed:
+                next_try = (n + 1) // 2
+                pending.extend(k for k in (next_try, n - next_try) if k > 0)
+                self.logger.warning(
+                    f"Error in vLLM client: {e}, trying again with {next_try} samples"
+                )
+            await asyncio.sleep(random.randint(1, 3))
+            total_num_attempts -= 1
+        return response
+
+    @backoff.on_exception(backoff.expo, httpx.HTTPError, max_time=10, max_tries=6)
+    async def _achat(self, messages: List[Dict], num_responses: int = 1) -> Dict:
+        """
+        Async variant of chat, used to issue several requests concurrently.
+
+        :param messages: A list of message dictionaries for the chat.
+        :type messages: List[Dict]
+        :param num_responses: Number of desired responses, default is 1.
+        :type num_responses: int
+        :return: The vLLM server's response.
+        :rtype: Dict
+        """
+        res = await self.aclient.post(
+            "/chat/completions", content=self._request_body(messages, num_responses)
+        )
+        res.raise_for_status()
+        response = _loads(res.content)
+        self._update_usage(response)
+        return response
+
+    def _update_usage(self, response: Dict) -> None:
+        """
+        Update token counts and the cost estimate from a response, and log it.
+
+        :param response: The vLLM server's response.
+        :type response: Dict
+        """
         # Update token counts if available
-        if hasattr(response, 'usage') and response.usage:
-            self.prompt_tokens += response.usage.prompt_tokens
-            self.completion_tokens += response.usage.completion_tokens
+        usage = response.get("usage")
+        if usage:
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
             prompt_tokens_k = float(self.prompt_tokens) / 1000.0
             completion_tokens_k = float(self.completion_tokens) / 1000.0
             self.cost = (
@@ -144,24 +351,26 @@ class vLLMClient(AbstractLanguageModel):
             f"Response from vLLM server: {response}"
             f"\nCost estimate: {self.cost}"
         )
-        return response
 
     def get_response_texts(
-        self, query_response: Union[List[ChatCompletion], ChatCompletion]
+        self, query_response: Union[List[Dict], Dict, List[str]]
     ) -> List[str]:
         """
         Extract the response texts from the vLLM server's response.
 
         :param query_response: The response(s) from the query method.
-        :type query_response: Union[List[ChatCompletion], ChatCompletion]
+        :type query_response: Union[List[Dict], Dict, List[str]]
         :return: List of response strings.
         :rtype: List[str]
         """
         if isinstance(query_response, list):
+            # Cached responses are already stored as texts
+            if all(isinstance(response, str) for response in query_response):
+                return query_response
             return [
-                choice.message.content
+                choice["message"]["content"]
                 for response in query_response
-                for choice in response.choices
+                for choice in response["choices"]
             ]
         else:
-            return [choice.message.content for choice in query_response.choices]
\ No newline at end of file
+            return [choice["message"]["content"] for choice in query_response["choices"]]
\ No newline at end of file